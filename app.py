@@ -2,10 +2,19 @@
 
 import os
 import io
+import re
 import json
-import base64
-from typing import List, Dict, Any
-
+import html
+import hashlib
+import functools
+import itertools
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import List, Dict, Any, Tuple
+
+import orjson
+# the SDK builds response schemas with pydantic, which rejects typing.TypedDict before 3.12
+from typing_extensions import TypedDict
 import streamlit as st
 from PIL import Image
 from gtts import gTTS
@@ -31,117 +40,54 @@ genai.configure(api_key=GEMINI_API_KEY)
 MODEL_NAME = "gemini-1.5-flash"
 
 # ==== Design ====
-st.markdown("""
-<style>
-/* Page */
-html, body, .stApp { background:#f7fafc !important; color:#0f172a; }
-
-/* Top green strip (like your screenshot) */
-.stApp::before{
-  content:"";
-  position:fixed; left:0; top:0; right:0; height:48px;
-  background:#2e7d32; z-index:0;
-}
-
-/* tokens */
-:root{
-  --ink:#0f172a; --muted:#6b7280; --card:#ffffff; --border:rgba(15,23,42,.10);
-  --shadow:0 10px 26px rgba(15,23,42,.08);
-  --brand:#2563eb;      /* analyze button (blue) */
-  --accent:#10b981;     /* emerald for product buttons if needed */
-  --accent2:#34d399;
-  --warn:#f59e0b; --warmpanel:#fff7ed; /* orange + warm canvas */
-}
-
-/* header */
-.header{ position:relative; z-index:1; margin:10px 0 14px; }
-.header h2{ margin:0; font-weight:800; letter-spacing:.2px; }
-.header .tag{ color:var(--muted); }
-
-/* cards */
-.card{ background:var(--card); border:1px solid var(--border); border-radius:16px; box-shadow:var(--shadow); }
-.card-body{ padding:16px 18px; }
-.card + .card{ margin-top:14px; }
-hr.sep{ border:none; border-top:1px solid var(--border); margin:12px 0; }
-
-/* tabs (clean, light) */
-.stTabs [data-baseweb="tab-list"]{ gap:8px; padding:6px; border-radius:12px; background:#fff; border:1px solid var(--border); box-shadow:var(--shadow); }
-.stTabs [data-baseweb="tab"]{ border-radius:10px; padding:10px 14px; font-weight:600; color:#1f2937; background:#f8fafc; border:1px solid #e5e7eb; }
-.stTabs [aria-selected="true"]{ color:#0b1220 !important; background:#fff !important; border:1px solid #93c5ae !important; }
-
-/* primary (Analyze) */
-.stButton > button[kind="primary"]{
-  background:linear-gradient(135deg, var(--brand), #3b82f6) !important;
-  color:#fff !important; border:0 !important; border-radius:12px !important;
-  padding:.7rem 1.25rem !important; font-weight:700 !important;
-  box-shadow:0 14px 28px rgba(37,99,235,.28) !important;
-}
-
-/* secondary reset (kept working + green gradient look) */
-.secbtn button{
-  background:linear-gradient(135deg,#10b981,#34d399) !important;
-  color:#fff !important; border:0 !important; border-radius:12px !important;
-  padding:.70rem 1.15rem !important; font-weight:700 !important;
-  box-shadow:0 12px 24px rgba(16,185,129,.25) !important;
-  width:100%;
-}
+@st.cache_data(show_spinner=False)
+def _load_css() -> str:
+    return "<style>" + (Path(__file__).parent / "assets" / "styles.css").read_text(encoding="utf-8") + "</style>"
 
-/* "Detected Issues" panel — warm, with orange rail */
-.issue-panel{
-  background:var(--warmpanel);
-  border:1px solid #fde7c7;
-  border-left:6px solid var(--warn);
-  border-radius:14px;
-  padding:14px;
-  box-shadow:0 6px 14px rgba(245,158,11,.12);
-}
-
-/* badges + progress */
-.badge{ display:inline-block; padding:4px 10px; border-radius:999px; font-weight:700; font-size:.78rem; }
-.badge-type{ background:#e0f2fe; color:#075985; border:1px solid #bae6fd; }
-.badge-low{ background:#dcfce7; color:#166534; border:1px solid #86efac; }
-.badge-med{ background:#fef9c3; color:#92400e; border:1px solid #fde68a; }
-.badge-high{ background:#fee2e2; color:#991b1b; border:1px solid #fecaca; }
-
-.progress-wrap{ width:100%; background:#f1f5f9; border-radius:10px; border:1px solid #e5e7eb; height:12px; overflow:hidden; }
-.progress-bar{ height:100%; border-radius:10px; background:linear-gradient(90deg,#f59e0b,#f97316); }
-
-/* image preview on summary (non-overlapping) */
-.summary-img{ max-width: 340px; }
-.summary-img img{ width:100%; height:auto; display:block; border-radius:12px; border:1px solid #e5e7eb; }
-.caption{ color:#64748b; font-size:.9rem; margin-top:6px; text-align:center; }
-
-/* product card tweaks */
-.pcard{ background:#fff; border:1px solid var(--border); border-radius:14px; box-shadow:var(--shadow); padding:12px 12px 10px; }
-.pcard h5{ margin:2px 0 6px; font-size:1rem; }
-.pbtn a{
-  display:inline-block; margin-top:8px; padding:6px 12px; border-radius:12px; text-decoration:none; color:#fff;
-  background:linear-gradient(135deg,#10b981,#34d399); font-weight:800; box-shadow:0 12px 24px rgba(16,185,129,.25);
-}
-</style>
-""", unsafe_allow_html=True)
+st.markdown(_load_css(), unsafe_allow_html=True)
 
 # ==== helpers ====
-def encode_image_bytes(img_bytes: bytes) -> str:
-    return base64.b64encode(img_bytes).decode("utf-8")
-
+# Gemini doesn't need full phone-camera resolution; cap the long side
+MAX_IMAGE_SIDE = 1024
+SMALL_JPEG_BYTES = 200_000
+# display width for both st.image calls (upload preview and summary card)
+IMAGE_WIDTH = 340
+
+# uploads are re-read on every rerun; normalize each distinct upload once
+@st.cache_data(show_spinner=False, max_entries=32)
 def to_jpeg_bytes(raw_bytes: bytes) -> bytes:
+    # already a small JPEG: nothing to gain from re-encoding
+    if len(raw_bytes) < SMALL_JPEG_BYTES and raw_bytes.startswith(b"\xff\xd8"):
+        return raw_bytes
     try:
-        im = Image.open(io.BytesIO(raw_bytes)).convert("RGB")
-        buf = io.BytesIO()
-        im.save(buf, format="JPEG", quality=92)
-        return buf.getvalue()
+        # close the source stream, decoded image, RGB copy and output buffer
+        # deterministically rather than leaving pixel data to the GC
+        with io.BytesIO(raw_bytes) as src, Image.open(src) as im:
+            # JPEG only: let the decoder downscale by 1/2..1/8 while loading
+            im.draft("RGB", (2 * MAX_IMAGE_SIDE, 2 * MAX_IMAGE_SIDE))
+            with im.convert("RGB") as rgb, io.BytesIO() as buf:
+                rgb.thumbnail((MAX_IMAGE_SIDE, MAX_IMAGE_SIDE), Image.Resampling.LANCZOS)
+                rgb.save(buf, format="JPEG", quality=85, optimize=True, progressive=True)
+                return buf.getvalue()
     except Exception:
         return raw_bytes
 
-def image_html(img_bytes: bytes, alt: str = "plant"):
-    b64 = base64.b64encode(img_bytes).decode("utf-8")
-    st.markdown(f"""
-    <div class="summary-img">
-      <img src="data:image/jpeg;base64,{b64}" alt="{alt}">
-      <div class="caption">{alt}</div>
-    </div>
-    """, unsafe_allow_html=True)
+# st.image resizes and re-encodes any image wider than its width= on every
+# render (output_format doesn't matter); give it a copy already at display
+# width so it serves the bytes as-is
+@st.cache_data(show_spinner=False, max_entries=32)
+def preview_bytes(jpeg_bytes: bytes) -> bytes:
+    try:
+        with io.BytesIO(jpeg_bytes) as src, Image.open(src) as im:
+            if im.width <= IMAGE_WIDTH:
+                return jpeg_bytes
+            im.draft("RGB", (IMAGE_WIDTH, IMAGE_WIDTH))
+            size = (IMAGE_WIDTH, max(1, round(im.height * IMAGE_WIDTH / im.width)))
+            with im.convert("RGB") as rgb, rgb.resize(size, Image.Resampling.LANCZOS) as small, io.BytesIO() as buf:
+                small.save(buf, format="JPEG", quality=85, optimize=True, progressive=True)
+                return buf.getvalue()
+    except Exception:
+        return jpeg_bytes
 
 # OSU links
 def osu_extension_links(plant: str, disease: str) -> List[Dict[str, str]]:
@@ -196,84 +142,197 @@ CATALOG = {
     ]
 }
 ACTIVE_KEYWORDS = {c["active"] for group in CATALOG.values() for c in group}
+CATALOG_BY_ACTIVE = {c["active"]: c for group in CATALOG.values() for c in group}
+CATEGORY_OF_ACTIVE = {c["active"]: cat for cat, group in CATALOG.items() for c in group}
+
+# one pass over the text for all actives; longest first so multi-word actives
+# win over any shorter prefix, and a leading word boundary keeps "bt" out of "doubt"
+_ACTIVES_RE = re.compile(
+    r"\b(?:" + "|".join(sorted((re.escape(a) for a in ACTIVE_KEYWORDS), key=len, reverse=True)) + ")",
+    re.IGNORECASE,
+)
 
 def extract_actives(text: str) -> List[str]:
-    text_l = (text or "").lower()
     found, seen = [], set()
-    for active in ACTIVE_KEYWORDS:
-        if active in text_l and active not in seen:
+    for m in _ACTIVES_RE.finditer(text or ""):
+        active = m.group(0).lower()
+        if active not in seen:
             seen.add(active); found.append(active)
     return found
 
+_TOKEN_RE = re.compile(r"[a-z]+")
+# stems match inflected forms (blighted, mildewed, bacterium...); short words
+# that would prefix-match unrelated ones ("rot" -> "rotate") are listed as exact forms
+BACT_STEMS = ("bacteri", "canker")
+BACT_KW = frozenset({"ooze","oozes","oozing"})
+FUNG_STEMS = ("fung", "blight", "mildew", "anthracnose")
+FUNG_KW = frozenset({"rust","rusts","rusty","rusted","rot","rots","rotted","rotten","rotting"})
+
 def detect_category(disease_text: str, treatment_text: str) -> str:
-    dl = (disease_text or "").lower() + " " + (treatment_text or "").lower()
-    if any(w in dl for w in ["bacteria","bacterial","canker","ooze"]): return "bacterial"
-    if any(w in dl for w in ["rust","blight","mildew","anthracnose","rot","fung"]): return "fungal"
-    if any(w in dl for w in ["aphid","whitefly","thrip","mite","borer","worm","caterpillar","beetle","leafminer","insect"]): return "insect"
+    toks = set(_TOKEN_RE.findall(((disease_text or "") + " " + (treatment_text or "")).lower()))
+    if toks & BACT_KW or any(t.startswith(BACT_STEMS) for t in toks): return "bacterial"
+    if toks & FUNG_KW or any(t.startswith(FUNG_STEMS) for t in toks): return "fungal"
+    # pests and anything unrecognized share the insect catalog
     return "insect"
 
-def curated_products(recommendation: str, disease_name: str) -> List[Dict[str, str]]:
-    category = detect_category(disease_name, recommendation)
+# pure in its inputs; issues often share the same treatment text. Returns a
+# tuple so callers can't mutate the cached result.
+@functools.lru_cache(maxsize=256)
+def curated_products(recommendation: str, disease_name: str) -> Tuple[Dict[str, str], ...]:
     actives = extract_actives(recommendation)
-    catalog_list = CATALOG.get(category, [])
-    if not catalog_list: return []
-    if actives:
-        chosen = []
-        for a in actives:
-            for item in catalog_list:
-                if item["active"] == a: chosen.append(item)
-        if len(chosen) < 2:
-            for item in catalog_list:
-                if item not in chosen:
-                    chosen.append(item)
-                    if len(chosen) >= 2: break
-        return chosen[:4]
-    return catalog_list[:2]
+    chosen = [CATALOG_BY_ACTIVE[a] for a in actives if a in CATALOG_BY_ACTIVE]
+    if not chosen:
+        return tuple(CATALOG.get(detect_category(disease_name, recommendation), [])[:2])
+    # pad to two from the same category as the first named active
+    picked = {id(item): item for item in chosen}
+    for item in CATALOG[CATEGORY_OF_ACTIVE[chosen[0]["active"]]]:
+        if len(picked) >= 2: break
+        picked.setdefault(id(item), item)
+    return tuple(picked.values())[:4]
+
+# shared per process for background network work (Gemini warm-up, TTS)
+@st.cache_resource(show_spinner=False)
+def _executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="bg")
 
 # ==== Gemini ====
-def analyze_plant(image_b64: str, plant_name: str) -> Dict[str, Any]:
-    model = genai.GenerativeModel(MODEL_NAME)
-    prompt = f"""
-    Analyze this image of a {plant_name} plant (United States context).
-    Return ONLY valid JSON in this exact shape:
-    {{
-      "results": [
-        {{"type":"disease|pest","name":"...","probability":"%","symptoms":"...","causes":"...","severity":"Low|Medium|High","spreading":"...","treatment":"Short, precise treatment text with active ingredients if possible","prevention":"..."}}
-      ],
-      "is_healthy": true|false,
-      "confidence": "%"
-    }}
-    If the plant looks healthy, set "is_healthy": true and "results": [].
-    """
-    parts = [{"mime_type":"image/jpeg","data": image_b64}]
-    resp = model.generate_content([prompt] + parts)
-    text = resp.text or ""
-    s, e = text.find("{"), text.rfind("}") + 1
-    if s < 0 or e <= 0:
-        return {"error":"Failed to parse the model response","raw":text}
+# Static instructions go in the system instruction so every request shares the
+# same prefix; only the plant name and image vary per call.
+SYSTEM_PROMPT = """
+You are a plant health assistant analyzing a single plant image (United States context).
+Return ONLY valid JSON in this exact shape:
+{
+  "results": [
+    {"type":"disease|pest","name":"...","probability":"%","symptoms":"...","causes":"...","severity":"Low|Medium|High","spreading":"...","treatment":"Short, precise treatment text with active ingredients if possible","prevention":"..."}
+  ],
+  "is_healthy": true|false,
+  "confidence": "%"
+}
+If the plant looks healthy, set "is_healthy": true and "results": [].
+"""
+
+# response schema for Gemini's JSON mode (mirrors SYSTEM_PROMPT)
+class Issue(TypedDict):
+    type: str
+    name: str
+    probability: str
+    symptoms: str
+    causes: str
+    severity: str
+    spreading: str
+    treatment: str
+    prevention: str
+
+class Analysis(TypedDict):
+    results: List[Issue]
+    is_healthy: bool
+    confidence: str
+
+GENERATION_CONFIG = {"response_mime_type": "application/json", "response_schema": Analysis}
+
+@st.cache_resource(show_spinner=False)
+def get_model() -> genai.GenerativeModel:
+    # one SDK model object per process
+    return genai.GenerativeModel(MODEL_NAME, system_instruction=SYSTEM_PROMPT,
+                                 generation_config=GENERATION_CONFIG)
+
+def _ping_model():
     try:
-        return json.loads(text[s:e])
-    except Exception as ex:
-        return {"error": f"Invalid JSON: {ex}", "raw": text[s:e]}
+        get_model().count_tokens("ping", request_options={"timeout": 5})
+    except Exception:
+        pass
+
+# once per process: build the model and open the API connection in the
+# background so the first Analyze click doesn't pay for it. Only the submit
+# happens under the cache_resource lock, so page rendering never waits on it.
+@st.cache_resource(show_spinner=False)
+def _warmup():
+    return _executor().submit(_ping_model)
+
+_warmup()
+
+def _chunk_text(chunk) -> str:
+    try:
+        return chunk.text or ""
+    except ValueError:  # chunk without text parts (e.g. finish/safety metadata)
+        return ""
+
+class AnalysisError(Exception):
+    # raised rather than returned so st.cache_data never stores a failure
+    def __init__(self, msg: str, raw: str = ""):
+        super().__init__(msg)
+        self.raw = raw
+
+def analyze_plant(jpeg_bytes: bytes, plant_name: str) -> Dict[str, Any]:
+    model = get_model()
+    # the SDK takes raw bytes; no need to base64 the payload ourselves
+    parts = [{"mime_type":"image/jpeg","data": jpeg_bytes}]
+    chunks: List[str] = []
+    progress = st.empty()
+    try:
+        for chunk in model.generate_content(parts + [f"Plant: {plant_name}"], stream=True):
+            chunks.append(_chunk_text(chunk))
+            progress.caption(f"Received {sum(len(c) for c in chunks)} chars…")
+    finally:
+        progress.empty()
+    text = "".join(chunks)
+    if not text.strip():
+        raise AnalysisError("Failed to parse the model response", text)
+    # JSON mode: the body is the object itself, no fences to strip
+    try:
+        obj = orjson.loads(text)
+    except orjson.JSONDecodeError:
+        # fallback if the model still wrapped the object in extra text
+        s, e = text.find("{"), text.rfind("}") + 1
+        try:
+            obj = json.loads(text[s:e])
+        except Exception as ex:
+            raise AnalysisError(f"Invalid JSON: {ex}", text) from ex
+    # a valid but non-object reply ([...], "str", null) must not reach the cache
+    if not isinstance(obj, dict):
+        raise AnalysisError("Unexpected response shape", text)
+    return obj
+
+# cache key is (image hash, normalized plant name); the leading underscore
+# keeps Streamlit from hashing the raw image bytes a second time
+@st.cache_data(show_spinner=False, ttl=3600, max_entries=128)
+def _analyze_plant_cached(img_sha256: str, plant_name: str, _jpeg_bytes: bytes) -> Dict[str, Any]:
+    return analyze_plant(_jpeg_bytes, plant_name)
 
 # ==== Audio ====
-def synthesize_summary(analysis: Dict[str, Any], plant_name: str) -> bytes:
+def _summary_text(analysis: Dict[str, Any], plant_name: str) -> str:
     if analysis.get("is_healthy"):
-        summary = f"Your {plant_name} plant appears healthy. Keep doing what you are doing."
-    elif analysis.get("results"):
+        return f"Your {plant_name} plant appears healthy. Keep doing what you are doing."
+    if analysis.get("results"):
         parts = []
         for r in analysis["results"]:
             parts.append(
                 f"{r.get('name','Unknown')}. Symptoms: {r.get('symptoms','')}. "
                 f"Treatment: {r.get('treatment','')}. Prevention: {r.get('prevention','')}."
             )
-        summary = "Detected issues: " + " ".join(parts)
-    else:
-        summary = "Analysis inconclusive."
-    fp = io.BytesIO()
+        return "Detected issues: " + " ".join(parts)
+    return "Analysis inconclusive."
+
+# The executor is shared by every session, so no TTS call may block forever.
+# TTS_TIMEOUT bounds each gTTS HTTP request; gTTS sends one request per
+# ~100-char chunk in sequence, so a long summary can take several times that.
+TTS_TIMEOUT = 10
+# AUDIO_WAIT is independent: how long one page render waits before giving up
+# on the audio. The job keeps running and caches its MP3, so a later rerun
+# picks it up instantly.
+AUDIO_WAIT = 15
+
+# keyed on the exact spoken text; failures raise and are therefore not cached
+@st.cache_data(show_spinner=False, ttl=3600, max_entries=64)
+def _tts_mp3(summary: str, lang: str = "en") -> bytes:
+    with io.BytesIO() as fp:
+        gTTS(text=summary, lang=lang, slow=False, timeout=TTS_TIMEOUT).write_to_fp(fp)
+        return fp.getvalue()
+
+def synthesize_summary(analysis: Dict[str, Any], plant_name: str) -> bytes:
+    text = _summary_text(analysis, plant_name)
     try:
-        gTTS(text=summary, lang="en", slow=False).write_to_fp(fp)
-        fp.seek(0); return fp.read()
+        return _tts_mp3(text) if text else b""
     except Exception:
         return b""
 
@@ -294,10 +353,48 @@ def progress_bar(pct: str) -> str:
     except Exception:
         v = 0
     v = max(0, min(100, v))
-    return f'''
-      <div class="progress-wrap"><div class="progress-bar" style="width:{v}%"></div></div>
-      <div class="small" style="margin-top:4px;"><strong>{v}%</strong></div>
-    '''
+    # single line so it can be embedded in a larger HTML block
+    return (f'<div class="progress-wrap"><div class="progress-bar" style="width:{v}%"></div></div>'
+            f'<div class="small" style="margin-top:4px;"><strong>{v}%</strong></div>')
+
+ISSUE_FIELDS = [("Symptoms","symptoms"), ("Causes","causes"), ("Spreading","spreading"),
+                ("Treatment","treatment"), ("Prevention","prevention")]
+
+def _field_html(v: Any) -> str:
+    # null/empty -> dash; escape, then keep the model's line breaks (a raw
+    # blank line would also end the HTML block mid-panel)
+    return html.escape(str(v or "—")).replace("\n", "<br>")
+
+def issue_html(idx: int, r: Dict[str, Any]) -> str:
+    parts = [
+        '<div class="issue-panel">',
+        f'<p><strong>{idx}. {_field_html(r.get("name") or "Unknown")}</strong> &nbsp; '
+        f'{type_badge(_field_html(r.get("type")))} &nbsp; {severity_badge(_field_html(r.get("severity")))}</p>',
+        '<p><strong>Probability:</strong></p>',
+        progress_bar(r.get("probability") or "0%"),
+    ]
+    for label, key in ISSUE_FIELDS:
+        parts.append(f'<p><strong>{label}:</strong><br>{_field_html(r.get(key))}</p>')
+    parts.append('</div>')
+    return "".join(parts)
+
+def products_html(items: List[Dict[str, str]]) -> str:
+    cards = "".join(
+        f'<div class="pcard"><h5>{p["title"]}</h5><div class="small">{p["snippet"]}</div>'
+        f'<div class="pbtn"><a href="{p["link"]}" target="_blank" rel="noopener">View product</a></div></div>'
+        for p in items
+    )
+    return f'<div class="pgrid">{cards}</div>'
+
+CARD_OPEN = '<div class="card"><div class="card-body">'
+CARD_CLOSE = '</div></div>'
+
+def card_open(body_md: str = ""):
+    # opening wrapper plus the card's first lines in a single message
+    st.markdown(CARD_OPEN + ("\n\n" + body_md if body_md else ""), unsafe_allow_html=True)
+
+def card_close():
+    st.markdown(CARD_CLOSE, unsafe_allow_html=True)
 
 # ==== Header ====
 st.markdown("""
@@ -307,9 +404,9 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
-# ==== Inputs (preview width=240 for 50% smaller) ====
+# ==== Inputs (preview matches the summary image so both share one media file) ====
 with st.container():
-    st.markdown('<div class="card"><div class="card-body">', unsafe_allow_html=True)
+    card_open()
     plant_name = st.text_input("Plant name", placeholder="e.g., Tomato, Apple, Corn")
 
     tab1, tab2 = st.tabs(["Upload", "Camera"])
@@ -321,117 +418,126 @@ with st.container():
             file = st.file_uploader("Upload a plant image", type=["jpg","jpeg","png"])
         with c2:
             if file:
-                image_bytes = file.read()
-                st.image(image_bytes, caption="Preview", width=240, output_format="JPEG")
+                image_bytes = to_jpeg_bytes(file.read())
+                st.image(preview_bytes(image_bytes), caption="Preview", width=IMAGE_WIDTH)
     with tab2:
         c1, c2 = st.columns([1, 2])
         with c1:
             pic = st.camera_input("Take a photo (mobile friendly)")
         with c2:
             if pic:
-                image_bytes = pic.getvalue()
-                st.image(image_bytes, caption="Preview", width=240, output_format="JPEG")
+                image_bytes = to_jpeg_bytes(pic.getvalue())
+                st.image(preview_bytes(image_bytes), caption="Preview", width=IMAGE_WIDTH)
 
     run_btn = st.button("Analyze", type="primary", disabled=not (plant_name and image_bytes))
-    st.markdown('</div></div>', unsafe_allow_html=True)
+    card_close()
 
 # ==== Results ====
+img_sha256 = hashlib.sha256(image_bytes).hexdigest() if image_bytes else ""
+
+# a stored analysis only applies to the inputs it was made for
+if "result" in st.session_state and (
+    st.session_state.get("img_sha256") != img_sha256 or st.session_state.get("plant_name") != plant_name
+):
+    for key in ("result", "jpeg_bytes", "plant_name", "img_sha256"):
+        st.session_state.pop(key, None)
+
 if run_btn and plant_name and image_bytes:
     with st.spinner("Analyzing image..."):
-        jpeg_bytes = to_jpeg_bytes(image_bytes)
-        b64 = encode_image_bytes(jpeg_bytes)
-        result = analyze_plant(b64, plant_name)
-
-    if "error" in result:
-        st.error(result["error"]); st.stop()
+        jpeg_bytes = image_bytes  # already normalized at upload
+        try:
+            result = _analyze_plant_cached(img_sha256, plant_name.strip().lower(), jpeg_bytes)
+        except AnalysisError as ex:
+            st.session_state.pop("result", None)
+            st.error(str(ex))
+            if ex.raw:
+                st.expander("Raw response").code(ex.raw)
+            st.stop()
+
+    # keep the analysis around so reruns from other widgets don't lose it
+    st.session_state["result"] = result
+    st.session_state["jpeg_bytes"] = jpeg_bytes
+    st.session_state["plant_name"] = plant_name
+    st.session_state["img_sha256"] = img_sha256
+
+result = st.session_state.get("result")
+if result:
+    jpeg_bytes = st.session_state["jpeg_bytes"]
+    plant_name = st.session_state["plant_name"]
+    audio_future = _executor().submit(synthesize_summary, result, plant_name or "your plant")
 
     st.success("Analysis complete.")
 
     left, right = st.columns([1.0, 2.0])
 
     with left:
-        st.markdown('<div class="card"><div class="card-body">', unsafe_allow_html=True)
-        image_html(jpeg_bytes, alt=plant_name or "plant")
+        card_open()
+        # served from Streamlit's media endpoint instead of an inline data URL
+        st.image(preview_bytes(jpeg_bytes), caption=plant_name or "plant", width=IMAGE_WIDTH)
 
-        st.markdown("### Analysis Summary")
         is_healthy = result.get("is_healthy", False)
         conf = result.get("confidence", "—")
-        st.markdown(f"**Plant:** {plant_name or '—'}")
-        st.markdown(f"**Status:** {'No issues detected' if is_healthy else 'Issues Detected'}")
-        st.markdown(f"**Confidence:** {conf}")
+        st.markdown(
+            "### Analysis Summary\n\n"
+            f"**Plant:** {plant_name or '—'}  \n"
+            f"**Status:** {'No issues detected' if is_healthy else 'Issues Detected'}  \n"
+            f"**Confidence:** {conf}"
+        )
 
-        audio = synthesize_summary(result, plant_name or "your plant")
-        if audio:
-            st.markdown("**Audio Summary:**")
-            st.audio(audio, format="audio/mp3")
+        # filled once the TTS future resolves, after the right column is drawn
+        audio_slot = st.empty()
 
         # Working reset button (kept)
         st.markdown('<div class="secbtn">', unsafe_allow_html=True)
         if st.button("Analyze another plant", key="reset_btn"):
             st.session_state.clear()
-            st.experimental_rerun()
+            st.rerun()
         st.markdown('</div>', unsafe_allow_html=True)
 
-        st.markdown('</div></div>', unsafe_allow_html=True)
+        card_close()
 
     with right:
-        st.markdown('<div class="card"><div class="card-body">', unsafe_allow_html=True)
-        st.markdown("### Detected Issues")
+        card_open("### Detected Issues")
 
         if result.get("results"):
+            # one frontend message per issue instead of one per field
             for idx, r in enumerate(result["results"], start=1):
-                name = r.get("name","Unknown")
-                tp = r.get("type","—")
-                prob = r.get("probability","0%")
-                sev = r.get("severity","—")
-
-                st.markdown(f'<div class="issue-panel">', unsafe_allow_html=True)
-                st.markdown(f"**{idx}. {name}**  &nbsp; {type_badge(tp)}  &nbsp; {severity_badge(sev)}", unsafe_allow_html=True)
-                st.markdown("**Probability:**")
-                st.markdown(progress_bar(prob), unsafe_allow_html=True)
-
-                st.markdown("**Symptoms:**");   st.write(r.get("symptoms","—"))
-                st.markdown("**Causes:**");     st.write(r.get("causes","—"))
-                st.markdown("**Spreading:**");  st.write(r.get("spreading","—"))
-                st.markdown("**Treatment:**");  st.write(r.get("treatment","—"))
-                st.markdown("**Prevention:**"); st.write(r.get("prevention","—"))
-                st.markdown('</div>', unsafe_allow_html=True)
-                st.markdown(' ', unsafe_allow_html=True)
+                st.markdown(issue_html(idx, r), unsafe_allow_html=True)
 
             first_name = result["results"][0].get("name", plant_name)
-            st.markdown("#### OSU Extension reading")
-            for link in osu_extension_links(plant_name, first_name):
-                st.markdown(f"- [{link['title']}]({link['link']})  \n  {link.get('snippet','')}")
+            st.markdown("#### OSU Extension reading\n\n" + "\n".join(
+                f"- [{link['title']}]({link['link']})  \n  {link.get('snippet','')}"
+                for link in osu_extension_links(plant_name, first_name)
+            ))
 
-            st.markdown('<hr class="sep"/>', unsafe_allow_html=True)
-            st.markdown("#### Recommended products (OSU-aligned actives)")
+            st.markdown('<hr class="sep"/>\n\n#### Recommended products (OSU-aligned actives)', unsafe_allow_html=True)
 
-            seen, items = set(), []
-            for r in result["results"]:
-                for p in curated_products(r.get("treatment",""), r.get("name","")):
-                    if p["title"] not in seen:
-                        seen.add(p["title"]); items.append(p)
+            all_products = itertools.chain.from_iterable(
+                curated_products(r.get("treatment",""), r.get("name","")) for r in result["results"]
+            )
+            # dedupe by title, keeping first-seen order
+            items = list({p["title"]: p for p in all_products}.values())
 
             if items:
-                for i in range(0, len(items), 2):
-                    cols = st.columns(2)
-                    for j in range(2):
-                        if i+j < len(items):
-                            p = items[i+j]
-                            with cols[j]:
-                                st.markdown(f"""
-                                <div class="pcard">
-                                  <h5>{p['title']}</h5>
-                                  <div class="small">{p['snippet']}</div>
-                                  <div class="pbtn"><a href="{p['link']}" target="_blank" rel="noopener">View product</a></div>
-                                </div>
-                                """, unsafe_allow_html=True)
+                st.markdown(products_html(items), unsafe_allow_html=True)
             else:
                 st.caption("No pesticide products recommended (e.g., viral issues). Focus on sanitation/prevention.")
         else:
             st.info("No issues detected.")
 
-        st.markdown('</div></div>', unsafe_allow_html=True)
+        card_close()
+
+    try:
+        audio = audio_future.result(timeout=AUDIO_WAIT)
+    except FutureTimeout:
+        # don't hang the page; clicking reruns the script and reads the MP3
+        # from _tts_mp3's cache once the background job finishes
+        audio_slot.button("Load audio summary", key="audio_retry")
+        audio = b""
+    if audio:
+        with audio_slot.container():
+            st.markdown("**Audio Summary:**")
+            st.audio(audio, format="audio/mp3")
 else:
     st.caption("Tip: On Streamlit Cloud this page is HTTPS, so the Camera tab works on phones.")
 